@@ -3,10 +3,20 @@
 Использует pywin32 для максимальной производительности и поддержки изображений.
 """
 
+import atexit
+import ctypes
 import io
+import logging
+import os
+import struct
+import threading
+import time
+from functools import lru_cache
 from typing import Optional, Union
 from PIL import Image
 import numpy as np
+
+log = logging.getLogger(__name__)
 # как использовать:
 # from utils.clipboard_manager import get_clipboard
 # class ScreenshotService:
@@ -20,15 +30,123 @@ import numpy as np
 #             print("Скриншот сохранен в буфер обмена Windows")
 #         return success
 
+# Буфер обмена Windows - глобальный ресурс: открываем его не более чем из одного потока за раз
+_CLIPBOARD_LOCK = threading.Lock()
+
+# Переиспользуемый BytesIO для BMP-кодирования (свой в каждом потоке)
+_tls = threading.local()
+
+# Сигнатура PNG-файла
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Константы BITMAPV5HEADER
+_BI_BITFIELDS = 3
+_LCS_SRGB = 0x73524742  # 'sRGB'
+_LCS_GM_IMAGES = 4
+
+# Изображения крупнее (в байтах после декодирования) не кэшируем; 4K RGBA влезает.
+# Вместе с размером кэша это ограничивает память: не более 2 * 32 МБ
+_PATH_CACHE_MAX_DECODED_SIZE = 32 * 1024 * 1024
+_PATH_CACHE_MAX_ENTRIES = 2
+
+# Флаг GlobalAlloc: перемещаемый блок, как требует SetClipboardData
+_GMEM_MOVEABLE = 0x0002
+
+
+def _dib_stride(width: int, bits_per_pixel: int) -> int:
+    """Длина строки DIB в байтах с выравниванием до 4 байт"""
+    return (width * bits_per_pixel // 8 + 3) & ~3
+
+
+def _encode_raw(image: Image.Image, rawmode: str, stride: int) -> bytes:
+    """
+    Аналог image.tobytes('raw', rawmode, stride, -1), но за один проход.
+
+    tobytes() кодирует кусками по 64 КБ и склеивает их через b"".join,
+    что для 4K-скриншота означает сотни кусков и лишнюю копию всех данных.
+    Здесь буфер энкодера сразу равен размеру изображения: пиковая память
+    та же (итоговые bytes всё равно нужны целиком), а копирование одно.
+    При изменении внутреннего API Pillow откатываемся на tobytes().
+    """
+    if not image.width or not image.height:
+        return b""
+
+    try:
+        image.load()
+        encoder = Image._getencoder(image.mode, 'raw', (rawmode, stride, -1))
+        # Границы передаем явно, как сам tobytes(): в новых Pillow они обязательны
+        encoder.setimage(image.im, (0, 0) + image.size)
+    except Exception as e:
+        log.debug("Однопроходный raw-энкодер недоступен, используем tobytes(): %s", e)
+        return image.tobytes('raw', rawmode, stride, -1)
+
+    chunks = []
+    while True:
+        _, errcode, data = encoder.encode(stride * image.height)
+        chunks.append(data)
+        if errcode:
+            break
+    if errcode < 0:
+        raise RuntimeError(f"Ошибка кодирования raw: {errcode}")
+
+    # Обычно кусок ровно один - возвращаем его без склейки
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+def _get_buf() -> io.BytesIO:
+    """Возвращает очищенный BytesIO текущего потока"""
+    buf = getattr(_tls, 'buf', None)
+    if buf is not None:
+        try:
+            buf.seek(0)
+            buf.truncate()
+            return buf
+        except BufferError:
+            # На старый буфер еще ссылается memoryview - заводим новый
+            pass
+    buf = _tls.buf = io.BytesIO()
+    return buf
+
+
+def _release_buf(view: memoryview):
+    """Отпускает срез BMP-буфера и очищает буфер потока, освобождая память"""
+    try:
+        view.release()
+        _tls.buf.seek(0)
+        _tls.buf.truncate()
+    except BufferError:
+        # На память еще ссылается кто-то другой - просто забываем буфер,
+        # он освободится вместе с последней ссылкой
+        _tls.buf = None
+
+
+@lru_cache(maxsize=_PATH_CACHE_MAX_ENTRIES)
+def _cached_open(path: str, mtime_ns: int, size: int) -> Optional[Image.Image]:
+    """
+    Открывает и декодирует файл изображения один раз.
+    mtime_ns и size входят в ключ кэша: измененный файл декодируется заново.
+
+    В кэше лежит отвязанная копия: файл закрывается сразу (важно для
+    многокадровых PNG/GIF, которые Pillow иначе держит открытыми).
+    Для изображений больше лимита после декодирования возвращает None -
+    кэшируется только этот дешевый ответ, а не сами пиксели.
+    """
+    with Image.open(path) as image:
+        # Размер после декодирования известен по заголовку, до load()
+        if image.width * image.height * len(image.getbands()) > _PATH_CACHE_MAX_DECODED_SIZE:
+            return None
+        # Копия общая для всех вызовов, поэтому дальше ее только читают
+        return image.copy()
+
 
 class ClipboardManager:
     """
     Оптимизированный менеджер буфера обмена для Windows.
 
     Особенности:
-    1. Приоритетное использование pywin32 для работы с изображениями
-    2. Pyperclip для текстовых операций
-    3. Поддержка numpy 2.x через проверку версий
+    1. Приоритетное использование pywin32 для изображений и текста
+    2. Pyperclip и tkinter как резерв для текста
+    3. numpy array в режимах L/RGBA передается в PIL без копирования
     4. Единый интерфейс для текста и изображений
     """
 
@@ -36,36 +154,152 @@ class ClipboardManager:
         """Инициализация с проверкой доступных библиотек"""
         self._has_win32 = False
         self._has_pyperclip = False
-        self._has_tkinter = False
+        # None - tkinter еще не проверялся (создается лениво, см. _ensure_tk)
+        self._has_tkinter = None
+        self._tk_root = None
 
         # Проверяем и импортируем pywin32
         try:
             import win32clipboard
+            import pywintypes
             self.win32clipboard = win32clipboard
+            self._win32_error = pywintypes.error
+            # Кэшируем функции и константы, чтобы не искать их при каждом вызове
+            (self._open, self._close, self._empty, self._set, self._get,
+             self._avail, self._set_text) = (
+                win32clipboard.OpenClipboard,
+                win32clipboard.CloseClipboard,
+                win32clipboard.EmptyClipboard,
+                win32clipboard.SetClipboardData,
+                win32clipboard.GetClipboardData,
+                win32clipboard.IsClipboardFormatAvailable,
+                win32clipboard.SetClipboardText,
+            )
+            self._CF_DIB = win32clipboard.CF_DIB
+            self._CF_DIBV5 = getattr(win32clipboard, 'CF_DIBV5', 17)
+            self._CF_UNICODETEXT = win32clipboard.CF_UNICODETEXT
+            # Зарегистрированный формат "PNG" (Paint.NET, Word, браузеры) -
+            # необязательный: без него просто не кладем PNG рядом с DIB
+            try:
+                self._CF_PNG = win32clipboard.RegisterClipboardFormat('PNG')
+            except pywintypes.error as e:
+                log.warning("Не удалось зарегистрировать формат PNG: %s", e)
+                self._CF_PNG = None
+            self._set_bytes = self._init_global_memory()
             self._has_win32 = True
         except ImportError as e:
-            print(
-                f"Внимание: pywin32 не доступен. Изображения не будут копироваться. Ошибка: {e}")
+            log.debug(
+                "Внимание: pywin32 не доступен. Изображения не будут копироваться. Ошибка: %s", e)
 
-        # Проверяем и импортируем pyperclip
-        try:
-            import pyperclip
-            self.pyperclip = pyperclip
-            self._has_pyperclip = True
-        except ImportError:
-            print(
-                "Внимание: pyperclip не доступен. Будет использован tkinter для текста.")
-
-        # Инициализируем tkinter как резервный вариант
+        # Pyperclip нужен только как резерв, когда pywin32 нет
+        if not self._has_win32:
+            try:
+                import pyperclip
+                self.pyperclip = pyperclip
+                self._has_pyperclip = True
+            except ImportError:
+                log.debug(
+                    "Внимание: pyperclip не доступен. Будет использован tkinter для текста.")
+
+        # Вместо __del__: очистка при выходе из интерпретатора
+        atexit.register(self.close)
+
+    def _init_global_memory(self):
+        """
+        Готовит ctypes-обертки над GlobalAlloc/SetClipboardData.
+
+        pywin32 копирует переданные bytes в свой HGLOBAL (да еще и с лишним
+        байтом), поэтому большие двоичные данные (DIB) кладем сами: одна
+        копия из bytes прямо в память, которой затем владеет Windows.
+        Возвращает функцию (формат, данные) для записи в буфер обмена.
+        """
         try:
-            import tkinter as tk
-            self.tk = tk
-            self._tk_root = tk.Tk()
-            self._tk_root.withdraw()  # Скрываем окно
-            self._has_tkinter = True
+            from ctypes import wintypes
+
+            # Свои экземпляры DLL, чтобы argtypes не влияли на других
+            kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+            user32 = ctypes.WinDLL('user32', use_last_error=True)
+
+            kernel32.GlobalAlloc.argtypes = (wintypes.UINT, ctypes.c_size_t)
+            kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+            kernel32.GlobalLock.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalLock.restype = wintypes.LPVOID
+            kernel32.GlobalUnlock.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalUnlock.restype = wintypes.BOOL
+            kernel32.GlobalFree.argtypes = (wintypes.HGLOBAL,)
+            kernel32.GlobalFree.restype = wintypes.HGLOBAL
+            user32.SetClipboardData.argtypes = (wintypes.UINT, wintypes.HANDLE)
+            user32.SetClipboardData.restype = wintypes.HANDLE
         except Exception as e:
-            print(f"Внимание: не удалось инициализировать tkinter: {e}")
-            self._tk_root = None
+            log.debug("Внимание: ctypes недоступен, используем pywin32: %s", e)
+            return self._set_joined
+
+        self._global_alloc = kernel32.GlobalAlloc
+        self._global_lock = kernel32.GlobalLock
+        self._global_unlock = kernel32.GlobalUnlock
+        self._global_free = kernel32.GlobalFree
+        self._set_handle = user32.SetClipboardData
+        return self._set_global
+
+    def _set_joined(self, fmt: int, data: Union[bytes, memoryview, tuple]):
+        """Запись через pywin32: части (кортеж) склеиваются заранее"""
+        if isinstance(data, tuple):
+            data = b"".join(data)
+        self._set(fmt, data)
+
+    def _set_global(self, fmt: int, data: Union[bytes, memoryview, tuple]):
+        """
+        Кладет bytes, memoryview или кортеж таких частей в буфер обмена
+        через GlobalAlloc + memmove. Части копируются друг за другом прямо
+        в выделенный блок - каждый байт копируется ровно один раз.
+        Буфер обмена должен быть уже открыт.
+        """
+        parts = data if isinstance(data, tuple) else (data,)
+        size = sum(len(part) for part in parts)
+        handle = self._global_alloc(_GMEM_MOVEABLE, size)
+        if not handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+        try:
+            ptr = self._global_lock(handle)
+            if not ptr:
+                raise ctypes.WinError(ctypes.get_last_error())
+            try:
+                offset = 0
+                for part in parts:
+                    length = len(part)
+                    if not isinstance(part, bytes):
+                        # memmove принимает только bytes или ctypes-объекты
+                        part = (ctypes.c_char * length).from_buffer(part)
+                    ctypes.memmove(ptr + offset, part, length)
+                    offset += length
+            finally:
+                self._global_unlock(handle)
+
+            if not self._set_handle(fmt, handle):
+                raise ctypes.WinError(ctypes.get_last_error())
+        except BaseException:
+            # Пока SetClipboardData не принял память, она наша
+            self._global_free(handle)
+            raise
+
+    def _ensure_tk(self) -> bool:
+        """
+        Лениво создает скрытое окно tkinter при первом обращении к резерву.
+        Пока доступны pyperclip/pywin32, tkinter вообще не загружается.
+        """
+        if self._has_tkinter is None:
+            try:
+                import tkinter as tk
+                self.tk = tk
+                self._tk_root = tk.Tk()
+                self._tk_root.withdraw()  # Скрываем окно
+                self._has_tkinter = True
+            except Exception as e:
+                log.debug("Внимание: не удалось инициализировать tkinter: %s", e)
+                self._tk_root = None
+                self._has_tkinter = False
+        return self._has_tkinter
 
     # ----------------------------------------------------------------
     # ОСНОВНОЙ ПУБЛИЧНЫЙ ИНТЕРФЕЙС
@@ -86,38 +320,42 @@ class ClipboardManager:
             True
         """
         if not isinstance(text, str):
-            print(f"Ошибка: ожидалась строка, получен {type(text)}")
+            log.warning("Ошибка: ожидалась строка, получен %s", type(text))
             return False
 
         try:
-            # Приоритет 1: Pyperclip (быстрее и надежнее для текста)
-            if self._has_pyperclip:
-                self.pyperclip.copy(text)
+            # Приоритет 1: Pywin32 (Windows native, без лишних оберток)
+            if self._has_win32:
+                with _CLIPBOARD_LOCK:
+                    self._open_with_retry()
+                    try:
+                        self._empty()
+                        self._set_text(text, self._CF_UNICODETEXT)
+                    finally:
+                        self._close()
                 return True
 
-            # Приоритет 2: Pywin32 (Windows native)
-            if self._has_win32:
-                self.win32clipboard.OpenClipboard()
-                self.win32clipboard.EmptyClipboard()
-                self.win32clipboard.SetClipboardText(text)
-                self.win32clipboard.CloseClipboard()
+            # Приоритет 2: Pyperclip
+            if self._has_pyperclip:
+                self.pyperclip.copy(text)
                 return True
 
             # Приоритет 3: Tkinter (резерв)
-            if self._has_tkinter:
+            if self._ensure_tk():
                 self._tk_root.clipboard_clear()
                 self._tk_root.clipboard_append(text)
-                self._tk_root.update()  # Фиксируем изменения
+                self._tk_root.update_idletasks()  # Фиксируем изменения без обработки всех событий
                 return True
 
-            print("Ошибка: нет доступных методов для работы с буфером обмена")
+            log.warning("Ошибка: нет доступных методов для работы с буфером обмена")
             return False
 
         except Exception as e:
-            print(f"Критическая ошибка при сохранении текста: {e}")
+            log.warning("Критическая ошибка при сохранении текста: %s", e)
             return False
 
-    def save_image(self, image_data: Union[Image.Image, bytes, np.ndarray, str]) -> bool:
+    def save_image(self, image_data: Union[Image.Image, bytes, np.ndarray],
+                   text: Optional[str] = None) -> bool:
         """
         Сохраняет изображение в буфер обмена Windows.
 
@@ -126,7 +364,10 @@ class ClipboardManager:
                        - PIL.Image.Image
                        - bytes (PNG/BMP/JPEG)
                        - numpy.ndarray (HxWxC или HxW)
-                       - str (путь к файлу)
+                       Путь к файлу передается в save_image_from_path.
+            text (str, optional): Текст (например, имя файла или расшифровка),
+                       который кладется в буфер вместе с изображением за одно
+                       открытие - приложение при вставке выберет нужный формат
 
         Returns:
             bool: True если успешно, False в случае ошибки
@@ -136,12 +377,12 @@ class ClipboardManager:
             >>> img = Image.open("screenshot.png")
             >>> clipboard.save_image(img)
 
-            >>> # Из numpy array (совместимость с вашим numpy 2.3.5)
+            >>> # Из numpy array
             >>> array = np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8)
             >>> clipboard.save_image(array)
 
-            >>> # Из файла
-            >>> clipboard.save_image("C:/path/to/image.png")
+            >>> # Изображение и текст одновременно
+            >>> clipboard.save_image(img, text="screenshot.png")
         """
         try:
             # Конвертируем в PIL Image
@@ -150,10 +391,41 @@ class ClipboardManager:
                 return False
 
             # Используем Windows-специфичный метод
-            return self._save_image_windows(pil_image)
+            return self._save_image_windows(
+                pil_image, self._extra_formats(image_data, text))
 
         except Exception as e:
-            print(f"Ошибка при сохранении изображения: {e}")
+            log.warning("Ошибка при сохранении изображения: %s", e)
+            return False
+
+    def save_image_from_path(self, path: str, text: Optional[str] = None) -> bool:
+        """
+        Сохраняет изображение из файла в буфер обмена Windows.
+
+        Args:
+            path (str): Путь к файлу изображения
+            text (str, optional): Текст, который кладется вместе с изображением
+
+        Returns:
+            bool: True если успешно, False в случае ошибки
+
+        Пример:
+            >>> clipboard.save_image_from_path("C:/path/to/image.png")
+            True
+        """
+        try:
+            extra = self._extra_formats(None, text)
+            st = os.stat(path)
+            image = _cached_open(path, st.st_mtime_ns, st.st_size)
+            if image is not None:
+                return self._save_image_windows(image, extra)
+
+            # Слишком большое для кэша - декодируем без сохранения и сразу закрываем файл
+            with Image.open(path) as image:
+                return self._save_image_windows(image, extra)
+
+        except Exception as e:
+            log.warning("Ошибка при сохранении изображения из файла %s: %s", path, e)
             return False
 
     # ----------------------------------------------------------------
@@ -162,95 +434,223 @@ class ClipboardManager:
 
     def _convert_to_pil(self, image_data) -> Optional[Image.Image]:
         """Конвертирует различные форматы в PIL Image"""
+        if isinstance(image_data, str):
+            raise TypeError(
+                "save_image не принимает строки, для файлов используйте save_image_from_path")
+
         try:
             # Если уже PIL Image
             if isinstance(image_data, Image.Image):
                 return image_data
 
-            # Если путь к файлу (строка)
-            elif isinstance(image_data, str):
-                return Image.open(image_data)
-
-            # Если bytes
+            # Если bytes (свой BytesIO: Image.open читает лениво, а обертка
+            # над bytes не копирует данные - общий буфер тут не подходит)
             elif isinstance(image_data, bytes):
                 return Image.open(io.BytesIO(image_data))
 
-            # Если numpy array (совместимость с numpy 2.3.5)
+            # Если numpy array
             elif isinstance(image_data, np.ndarray):
-                # Проверяем версию numpy для совместимости
-                np_version = tuple(map(int, np.__version__.split('.')[:2]))
-
-                if np_version >= (2, 0):
-                    # numpy 2.x - используем стандартный метод
-                    return Image.fromarray(image_data)
-                else:
-                    # numpy 1.x - проверяем типы данных
-                    if image_data.dtype == np.uint8:
-                        return Image.fromarray(image_data)
-                    else:
-                        # Конвертируем в uint8 если нужно
-                        normalized = np.clip(
-                            image_data, 0, 255).astype(np.uint8)
-                        return Image.fromarray(normalized)
+                return self._array_to_pil(image_data)
 
             else:
-                print(f"Неподдерживаемый формат: {type(image_data)}")
+                log.warning("Неподдерживаемый формат: %s", type(image_data))
                 return None
 
         except Exception as e:
-            print(f"Ошибка конвертации в PIL: {e}")
+            log.warning("Ошибка конвертации в PIL: %s", e)
             return None
 
-    def _save_image_windows(self, image: Image.Image) -> bool:
+    def _extra_formats(self, image_data, text: Optional[str]) -> list:
+        """Дополнительные форматы, которые кладутся вместе с изображением"""
+        extra = []
+        if self._has_win32:
+            # Готовый PNG кладем как есть - без перекодирования;
+            # DIB остается для приложений вроде Paint
+            if (self._CF_PNG is not None and isinstance(image_data, bytes)
+                    and image_data.startswith(_PNG_SIGNATURE)):
+                extra.append((self._CF_PNG, image_data))
+            if text is not None:
+                extra.append((self._CF_UNICODETEXT, text))
+        return extra
+
+    def _array_to_pil(self, array: np.ndarray) -> Image.Image:
+        """
+        Превращает numpy array в PIL Image через Image.frombuffer.
+
+        Pillow отображает без копирования только режимы L и RGBA: для них
+        изображение разделяет память с массивом, и массив нельзя изменять,
+        пока изображение используется. HxWx3 (RGB) Pillow копирует.
+        """
+        if array.dtype != np.uint8:
+            if array.dtype.kind not in 'iuf':
+                # bool и прочие нечисловые типы отдаем Pillow: маска bool
+                # станет режимом '1' (True -> белый), а не uint8 со значением 1
+                return Image.fromarray(array)
+            # Обрезаем сразу в uint8-буфер: одна аллокация вместо clip + astype
+            out = np.empty(array.shape, dtype=np.uint8)
+            np.clip(array, 0, 255, out=out, casting='unsafe')
+            array = out
+
+        if array.ndim == 2:
+            mode = 'L'
+        elif array.ndim == 3 and array.shape[2] == 3:
+            mode = 'RGB'
+        elif array.ndim == 3 and array.shape[2] == 4:
+            mode = 'RGBA'
+        else:
+            # Нестандартная форма - пусть Pillow разбирается сам
+            return Image.fromarray(array)
+
+        array = np.ascontiguousarray(array)
+        height, width = array.shape[:2]
+        return Image.frombuffer(mode, (width, height), array, 'raw', mode, 0, 1)
+
+    def _save_image_windows(self, image: Image.Image, extra=()) -> bool:
         """
         Основной метод сохранения изображения через Windows API.
-        Использует формат DIB (Device Independent Bitmap).
+        Использует формат DIB (Device Independent Bitmap), а для RGBA -
+        DIBV5 с альфа-каналом (CF_DIB Windows синтезирует сама).
+        extra - дополнительные пары (формат, данные) для того же открытия.
         """
         if not self._has_win32:
-            print("Ошибка: pywin32 недоступен для сохранения изображений")
+            log.warning("Ошибка: pywin32 недоступен для сохранения изображений")
             return False
 
         try:
-            # Конвертируем в режим RGB если нужно
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            # Создаем BMP в памяти (Windows ожидает именно BMP для буфера обмена)
-            output = io.BytesIO()
-
-            # Сохраняем как BMP
-            # Важно: не использовать сжатие
-            image.save(output, 'BMP', compress_level=0)
-            bmp_data = output.getvalue()
-            output.close()
+            if image.mode == 'RGBA':
+                # 32bpp BGRA без конвертации и с сохранением прозрачности
+                fmt = self._CF_DIBV5
+                dib_data = self._image_to_dibv5(image)
+            else:
+                # Конвертируем в режим RGB только для прочих режимов (P, L, CMYK...)
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
 
-            # Windows требует DIB формат (BMP без заголовка файла)
-            # Заголовок BMP файла = 14 байт
-            dib_data = bmp_data[14:]
+                # Собираем DIB напрямую из пикселей, без BMP-кодировщика
+                fmt = self._CF_DIB
+                try:
+                    dib_data = self._image_to_dib(image)
+                except Exception:
+                    dib_data = self._image_to_dib_via_bmp(image)
 
             # Копируем в буфер обмена Windows
-            self.win32clipboard.OpenClipboard()
-            self.win32clipboard.EmptyClipboard()
-
-            # Используем CF_DIB для совместимости
-            self.win32clipboard.SetClipboardData(
-                self.win32clipboard.CF_DIB,
-                dib_data
-            )
-
-            self.win32clipboard.CloseClipboard()
+            try:
+                self._set_many([(fmt, dib_data), *extra])
+            finally:
+                if isinstance(dib_data, memoryview):
+                    # Данные уже скопированы - не держим кадр в BMP-буфере потока
+                    _release_buf(dib_data)
             return True
 
         except Exception as e:
-            print(f"Ошибка Windows API при сохранении изображения: {e}")
+            log.warning("Ошибка Windows API при сохранении изображения: %s", e)
+            return False
+
+    def _set_many(self, items):
+        """
+        Кладет в буфер обмена несколько форматов за одно открытие.
+
+        Args:
+            items: пары (формат, данные); str пишется через pywin32,
+                   двоичные данные (bytes, memoryview или кортеж частей) - через _set_bytes
+        """
+        with _CLIPBOARD_LOCK:
+            self._open_with_retry()
+            try:
+                self._empty()
+                for fmt, data in items:
+                    if isinstance(data, str):
+                        self._set(fmt, data)
+                    else:
+                        self._set_bytes(fmt, data)
+            finally:
+                self._close()
 
-            # Пробуем закрыть буфер обмена если произошла ошибка
+    def _open_with_retry(self, tries: int = 10, delay: float = 0.005):
+        """
+        Открывает буфер обмена, повторяя попытки с растущей паузой:
+        буфер может быть временно занят другим процессом.
+        """
+        for attempt in range(tries - 1):
             try:
-                self.win32clipboard.CloseClipboard()
-            except:
-                pass
+                self._open()
+                return
+            except self._win32_error:
+                time.sleep(delay * (attempt + 1))
+        self._open()
 
-            return False
+    def _image_to_dib(self, image: Image.Image) -> tuple:
+        """
+        Собирает CF_DIB (BITMAPINFOHEADER + пиксели) напрямую из RGB-данных.
+        Строки идут снизу вверх в порядке BGR, как в обычном BMP.
+        Возвращает части (заголовок, пиксели) - склеиваются они уже
+        при копировании в память буфера обмена, без лишней копии.
+        """
+        width, height = image.size
+        # Энкодер Pillow сам дополняет строки до stride - отдельный проход не нужен
+        stride = _dib_stride(width, 24)
+
+        header = struct.pack(
+            '<IiiHHIIiiII',
+            40,               # biSize
+            width,            # biWidth
+            height,           # biHeight (> 0: строки снизу вверх)
+            1,                # biPlanes
+            24,               # biBitCount
+            0,                # biCompression = BI_RGB
+            stride * height,  # biSizeImage
+            0, 0,             # biXPelsPerMeter, biYPelsPerMeter
+            0, 0              # biClrUsed, biClrImportant
+        )
+        pixels = _encode_raw(image, 'BGR', stride)
+        return header, pixels
+
+    def _image_to_dibv5(self, image: Image.Image) -> tuple:
+        """
+        Собирает CF_DIBV5 (BITMAPV5HEADER + пиксели) из RGBA-данных.
+        32bpp BGRA, маски каналов задаются явно через BI_BITFIELDS.
+        Как и _image_to_dib, возвращает части (заголовок, пиксели).
+        """
+        width, height = image.size
+        stride = _dib_stride(width, 32)
+
+        header = struct.pack(
+            '<IiiHHIIiiII4II36x3I4I',
+            124,              # bV5Size
+            width,            # bV5Width
+            height,           # bV5Height (> 0: строки снизу вверх)
+            1,                # bV5Planes
+            32,               # bV5BitCount
+            _BI_BITFIELDS,    # bV5Compression
+            stride * height,  # bV5SizeImage
+            0, 0,             # bV5XPelsPerMeter, bV5YPelsPerMeter
+            0, 0,             # bV5ClrUsed, bV5ClrImportant
+            0x00FF0000,       # bV5RedMask
+            0x0000FF00,       # bV5GreenMask
+            0x000000FF,       # bV5BlueMask
+            0xFF000000,       # bV5AlphaMask
+            _LCS_SRGB,        # bV5CSType (bV5Endpoints - 36 нулевых байт)
+            0, 0, 0,          # bV5GammaRed, bV5GammaGreen, bV5GammaBlue
+            _LCS_GM_IMAGES,   # bV5Intent
+            0, 0, 0           # bV5ProfileData, bV5ProfileSize, bV5Reserved
+        )
+        pixels = _encode_raw(image, 'BGRA', stride)
+        return header, pixels
+
+    def _image_to_dib_via_bmp(self, image: Image.Image) -> memoryview:
+        """
+        Резервный путь: DIB через BMP-кодировщик Pillow.
+        Возвращает срез памяти BytesIO без промежуточных getvalue()
+        и копии [14:]; после записи срез отпускается через _release_buf().
+        """
+        output = _get_buf()
+
+        # Сохраняем как BMP (Pillow всегда пишет его без сжатия, BI_RGB)
+        image.save(output, 'BMP')
+
+        # Windows требует DIB формат (BMP без заголовка файла)
+        # Заголовок BMP файла = 14 байт
+        return output.getbuffer()[14:]
 
     # ----------------------------------------------------------------
     # ДОПОЛНИТЕЛЬНЫЕ МЕТОДЫ
@@ -264,27 +664,25 @@ class ClipboardManager:
             str или None если буфер пуст или произошла ошибка
         """
         try:
-            # Приоритет 1: Pyperclip
+            # Приоритет 1: Windows API
+            if self._has_win32:
+                with _CLIPBOARD_LOCK:
+                    self._open_with_retry()
+                    try:
+                        # Пробуем получить текст
+                        if self._avail(self._CF_UNICODETEXT):
+                            data = self._get(self._CF_UNICODETEXT)
+                            return str(data) if data else None
+                        return None
+                    finally:
+                        self._close()
+
+            # Приоритет 2: Pyperclip
             if self._has_pyperclip:
                 return self.pyperclip.paste()
 
-            # Приоритет 2: Windows API
-            if self._has_win32:
-                self.win32clipboard.OpenClipboard()
-                try:
-                    # Пробуем получить текст
-                    if self.win32clipboard.IsClipboardFormatAvailable(
-                        self.win32clipboard.CF_UNICODETEXT
-                    ):
-                        data = self.win32clipboard.GetClipboardData(
-                            self.win32clipboard.CF_UNICODETEXT
-                        )
-                        return str(data) if data else None
-                finally:
-                    self.win32clipboard.CloseClipboard()
-
             # Приоритет 3: Tkinter
-            if self._has_tkinter:
+            if self._ensure_tk():
                 try:
                     return self._tk_root.clipboard_get()
                 except:
@@ -293,7 +691,7 @@ class ClipboardManager:
             return None
 
         except Exception as e:
-            print(f"Ошибка при получении текста: {e}")
+            log.warning("Ошибка при получении текста: %s", e)
             return None
 
     def clear(self) -> bool:
@@ -301,16 +699,19 @@ class ClipboardManager:
         try:
             # Приоритет: Windows API
             if self._has_win32:
-                self.win32clipboard.OpenClipboard()
-                self.win32clipboard.EmptyClipboard()
-                self.win32clipboard.CloseClipboard()
+                with _CLIPBOARD_LOCK:
+                    self._open_with_retry()
+                    try:
+                        self._empty()
+                    finally:
+                        self._close()
                 return True
 
             # Альтернатива: пустой текст
             return self.save_text("")
 
         except Exception as e:
-            print(f"Ошибка при очистке буфера: {e}")
+            log.warning("Ошибка при очистке буфера: %s", e)
             return False
 
     # ----------------------------------------------------------------
@@ -326,23 +727,30 @@ class ClipboardManager:
         self.close()
 
     def close(self):
-        """Освобождение ресурсов (особенно tkinter)"""
-        if hasattr(self, '_tk_root') and self._tk_root:
-            try:
-                self._tk_root.destroy()
-            except:
-                pass
-
-    def __del__(self):
-        """Деструктор - автоматическая очистка"""
-        self.close()
+        """Освобождение ресурсов (tkinter, кэш файлов). Повторный вызов безопасен"""
+        # Кэш декодированных файлов общий для модуля - отпускаем и его
+        _cached_open.cache_clear()
+        # Реестр atexit держит сильную ссылку на экземпляр - снимаем ее
+        atexit.unregister(self.close)
+
+        if self._tk_root is None:
+            return
+        try:
+            self._tk_root.destroy()
+        except:
+            pass
+        # При следующем обращении к резерву окно будет создано заново
+        self._tk_root = None
+        self._has_tkinter = None
 
 # ----------------------------------------------------------------
 # ГЛОБАЛЬНЫЙ СИНГЛТОН И УДОБНЫЕ ФУНКЦИИ
 # ----------------------------------------------------------------
 
 
-_clipboard_instance = None
+# Создаем экземпляр сразу при импорте: tkinter инициализируется лениво,
+# так что это дешево, а get_clipboard() сводится к возврату константы
+_clipboard_instance = ClipboardManager()
 
 
 def get_clipboard() -> ClipboardManager:
@@ -357,32 +765,15 @@ def get_clipboard() -> ClipboardManager:
         >>> clipboard = get_clipboard()
         >>> clipboard.save_text("Пример")
     """
-    global _clipboard_instance
-    if _clipboard_instance is None:
-        _clipboard_instance = ClipboardManager()
     return _clipboard_instance
 
-# Удобные функции для быстрого доступа
-
-
-def copy_text(text: str) -> bool:
-    """Быстрое копирование текста в буфер обмена"""
-    return get_clipboard().save_text(text)
-
-
-def copy_image(image_data) -> bool:
-    """Быстрое копирование изображения в буфер обмена"""
-    return get_clipboard().save_image(image_data)
-
-
-def paste_text() -> Optional[str]:
-    """Быстрое получение текста из буфера обмена"""
-    return get_clipboard().get_text()
-
 
-def clear_clipboard() -> bool:
-    """Быстрая очистка буфера обмена"""
-    return get_clipboard().clear()
+# Удобные функции для быстрого доступа - методы синглтона без обертки
+copy_text = _clipboard_instance.save_text          # копирование текста
+copy_image = _clipboard_instance.save_image        # копирование изображения
+copy_image_from_path = _clipboard_instance.save_image_from_path  # изображение из файла
+paste_text = _clipboard_instance.get_text          # получение текста
+clear_clipboard = _clipboard_instance.clear        # очистка буфера
 
 # ----------------------------------------------------------------
 # ТЕСТИРОВАНИЕ И ДЕМОНСТРАЦИЯ